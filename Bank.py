@@ -2,8 +2,10 @@
 from dotenv import load_dotenv
 import os
 import requests
+import atexit
 import json
 import random
+import threading
 import time
 import re
 
@@ -176,6 +178,22 @@ class Boerse:
             raise ValueError(f"Ungültige Währung: {nach}")
         return betrag / self.kurse[von] * self.kurse[nach]
 
+    def kurs(self, von, nach):
+        """
+        Gibt den Faktor zurück, mit dem ein Betrag von einer Währung in eine andere umgerechnet wird.
+
+        :param von: str
+        :param nach: str
+        :return: float: Der Umrechnungsfaktor
+        """
+        typecheck(von, str)
+        typecheck(nach, str)
+        if von not in self.kurse:
+            raise ValueError(f"Ungültige Währung: {von}")
+        if nach not in self.kurse:
+            raise ValueError(f"Ungültige Währung: {nach}")
+        return self.kurse[nach] / self.kurse[von]
+
 
 # endregion
 
@@ -189,6 +207,7 @@ class Konto:
             self.iban = f"DE {random.randint(0, 9):02d}{random.randint(0, 99):02d} {random.randint(0, 9999):04d} " \
                         f"{random.randint(0, 9999):04d} {random.randint(0, 9999):04d} {random.randint(0, 9999):04d}"
         self.buchungen = []  # Liste von Buchungen (Betrag, Währung, Verwendungszweck)
+        self.journal = None  # Journal, in dem die Buchungen protokolliert werden (siehe Journal)
 
     def __str__(self):
         """
@@ -223,6 +242,25 @@ class Konto:
         konto.buchungen = data["buchungen"]
         return konto
 
+    def buchungen_schreiben(self, *buchungen):
+        """
+        Schreibt Buchungen auf Konten. Falls eines der beteiligten Konten ein Journal hat, werden die Buchungen
+        über das Journal geschrieben: gemeinsam als ein Eintrag protokolliert und bei einer Wiederherstellung
+        ganz oder gar nicht übernommen.
+        Beispiel: Beide Seiten einer Überweisung werden zusammen geschrieben.
+
+        :param buchungen: tuple: (Konto, (Betrag, Währung, Verwendungszweck))
+        :return: None
+        """
+        journale = {id(konto.journal): konto.journal for konto, _buchung in buchungen if konto.journal is not None}
+        if len(journale) > 1:
+            raise ValueError("Die Konten gehören zu verschiedenen Journalen")
+        if journale:
+            journale.popitem()[1].schreiben(buchungen)
+            return
+        for konto, buchung in buchungen:
+            konto.buchungen.append(buchung)
+
     def buchen(self, betrag, verwendungszweck):
         """
         Führt eine Buchung auf dem Konto durch.
@@ -234,7 +272,7 @@ class Konto:
         betrag, waehrung = waehrung_interpretieren(betrag)
         if waehrung != "EUR":
             raise ValueError("Buchungen können nur in Euro durchgeführt werden")
-        self.buchungen.append((betrag, waehrung, verwendungszweck))
+        self.buchungen_schreiben((self, (betrag, waehrung, verwendungszweck)))
 
     def ueberweisen(self, ziel, betrag, verwendungszweck):
         """
@@ -253,8 +291,8 @@ class Konto:
             raise ValueError("Nicht genügend Guthaben") 
         if betrag <= 0:
             raise ValueError("Betrag muss größer als 0 sein")
-        self.buchungen.append((-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-        ziel.buchungen.append((betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+        self.buchungen_schreiben((self, (-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                 (ziel, (betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}")))
 
     def saldo(self, formatiert=False):
         """
@@ -312,7 +350,7 @@ class MultiKonto(Konto):
         :return: None
         """
         betrag, waehrung = waehrung_interpretieren(betrag)
-        self.buchungen.append((betrag, waehrung, verwendungszweck))
+        self.buchungen_schreiben((self, (betrag, waehrung, verwendungszweck)))
 
     def ueberweisen(self, ziel, betrag, verwendungszweck):
         """
@@ -330,8 +368,8 @@ class MultiKonto(Konto):
             # Überprüfen, ob genügend Guthaben vorhanden ist (zwischen allen Währungen)
             if self.saldo() - self.boerse.umrechnen(betrag, waehrung, "EUR") < 0:
                 raise ValueError("Nicht genügend Guthaben")
-            self.buchungen.append((-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-            ziel.buchungen.append((betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+            self.buchungen_schreiben((self, (-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                     (ziel, (betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}")))
         else:
             # Überweisung von MultiKonto zu Konto erfolgt in Euro
             # Nicht Euro-Beträge werden umgerechnet
@@ -339,8 +377,8 @@ class MultiKonto(Konto):
             betrag = round(self.boerse.umrechnen(betrag, waehrung, "EUR"), 2)
             if self.saldo() < betrag:
                 raise ValueError("Nicht genügend Guthaben")
-            self.buchungen.append((-betrag, "EUR", f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-            ziel.buchungen.append((betrag, "EUR", f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+            self.buchungen_schreiben((self, (-betrag, "EUR", f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                     (ziel, (betrag, "EUR", f"Überweisung von {self.inhaber}: {verwendungszweck}")))
 
     def saldo(self, waehrung="", formatiert=False):
         """
@@ -380,25 +418,76 @@ class MultiKonto(Konto):
         betrag, _waehrung = waehrung_interpretieren(betrag)
         if von not in self.boerse.waehrungen:
             raise ValueError(f"Ungültige Währung: {von}")
-        self.buchungen.append((-betrag, von, verwendungszweck))
         # Gutschrift der Zielwährung
         umgerechnet = round(self.boerse.umrechnen(betrag, von, nach), 2)
-        self.buchungen.append((umgerechnet, nach, verwendungszweck))
+        # Abbuchung und Gutschrift werden gemeinsam gebucht
+        self.buchungen_schreiben((self, (-betrag, von, verwendungszweck)),
+                                 (self, (umgerechnet, nach, verwendungszweck)))
 
     def waehrungen_verrechnen(self):
         """
         Setzt alle nicht-Euro-Kontostände auf 0, indem alle ausstehenden Beträge in Euro umgerechnet werden.
         :return: None
         """
-        # Alle Währungen außer Euro in eine Liste speichern
-        waehrungen = [waehrung for waehrung in self.boerse.waehrungen if waehrung != "EUR"]
-        # Alle Währungen durchgehen
-        for waehrung in waehrungen:
-            # Saldo in der Währung berechnen
-            saldo = self.saldo(waehrung)
+        konten_verrechnen([self], self.boerse)
+# endregion
+
+
+# region Verrechnung (Netting) mehrerer MultiKonten
+def konten_verrechnen(konten, boerse=None):
+    """
+    Verrechnet die Fremdwährungen mehrerer MultiKonten in einem Durchgang.
+    Zuerst werden die Nettopositionen aller Konten je Währung ermittelt, danach wird jede Währung
+    nur einmal zum gemeinsamen Kurs umgerechnet. Die Buchungen werden direkt (ohne Umweg über
+    waehrung_interpretieren) und gesammelt pro Konto geschrieben.
+    Beispiel: Saldo 100 USD wird als -100 USD und +94,60 EUR gebucht (wie bei waehrungen_verrechnen).
+
+    :param konten: list: Die MultiKonten
+    :param boerse: Boerse: Die gemeinsame Börse (leer = neue Börse)
+    :return: dict: Die Nettoposition je Währung als (Betrag, Betrag in Euro)
+    """
+    if boerse is None:
+        boerse = Boerse()
+    typecheck(boerse, Boerse)
+
+    # Jedes Konto nur einmal verrechnen, auch wenn es mehrfach übergeben wird
+    konten = list({id(konto): konto for konto in konten}.values())
+
+    # Nettopositionen je Konto und Währung in einem Durchgang über alle Buchungen
+    positionen = []
+    for konto in konten:
+        typecheck(konto, MultiKonto)
+        salden = {}
+        for buchung in konto.buchungen:
+            if buchung[1] != "EUR":
+                salden[buchung[1]] = salden.get(buchung[1], 0) + buchung[0]
+        positionen.append(salden)
+
+    # Jede Währung nur einmal umrechnen (unbekannte Währungen werden wie bisher übergangen)
+    reihenfolge = {waehrung: i for i, waehrung in enumerate(boerse.waehrungen)}
+    kurse = {}
+    for salden in positionen:
+        for waehrung in salden:
+            if waehrung not in kurse and waehrung in reihenfolge:
+                kurse[waehrung] = boerse.kurs(waehrung, "EUR")
+
+    # Buchungen gesammelt schreiben
+    netto = {}
+    for konto, salden in zip(konten, positionen):
+        buchungen = []
+        for waehrung in sorted(kurse.keys() & salden.keys(), key=reihenfolge.get):
+            saldo = salden[waehrung]
             # Wenn der Saldo nicht 0 ist, wird er in Euro umgerechnet und als Buchung hinzugefügt
             if saldo != 0:
-                self.umrechnen(saldo, waehrung, "EUR", f"Verrechnung von {waehrung_formatieren(saldo, waehrung)}")
+                umgerechnet = round(saldo * kurse[waehrung], 2)
+                verwendungszweck = f"Verrechnung von {waehrung_formatieren(saldo, waehrung)}"
+                buchungen.append((-saldo, waehrung, verwendungszweck))
+                buchungen.append((umgerechnet, "EUR", verwendungszweck))
+                summe, summe_eur = netto.get(waehrung, (0, 0))
+                netto[waehrung] = (summe + saldo, summe_eur + umgerechnet)
+        if buchungen:
+            konto.buchungen_schreiben(*[(konto, buchung) for buchung in buchungen])
+    return netto
 # endregion
 
 
@@ -415,7 +504,376 @@ class Sparkonto(Konto):
         :return: None
         """
         zinsen = self.saldo() * self.zinssatz
-        self.buchungen.append((zinsen, "EUR", "Zinsen" + f" ({self.zinssatz * 100:.2f} %)"))
+        self.buchungen_schreiben((self, (zinsen, "EUR", "Zinsen" + f" ({self.zinssatz * 100:.2f} %)")))
+# endregion
+
+
+# region Journal (Write-Ahead-Log) und Wiederherstellung
+KONTOTYPEN = {"Konto": Konto, "MultiKonto": MultiKonto, "Sparkonto": Sparkonto}
+
+
+def konto_daten(konto):
+    """
+    Wandelt ein Konto in ein JSON-fähiges dict um (inklusive Kontotyp).
+
+    :param konto: Konto
+    :return: dict: Die Daten des Kontos
+    """
+    typecheck(konto, Konto)
+    daten = {"typ": type(konto).__name__, "inhaber": konto.inhaber, "iban": konto.iban,
+             "buchungen": list(konto.buchungen)}
+    if isinstance(konto, Sparkonto):
+        daten["zinssatz"] = konto.zinssatz
+    return daten
+
+
+def konto_aus_daten(daten):
+    """
+    Erstellt ein Konto aus den Daten von konto_daten.
+
+    :param daten: dict
+    :return: Konto: Das Konto-Objekt
+    """
+    if daten["typ"] not in KONTOTYPEN:
+        raise ValueError(f"Ungültiger Kontotyp: {daten['typ']}")
+    konto = KONTOTYPEN[daten["typ"]](daten["inhaber"], daten["iban"])
+    konto.buchungen = [tuple(buchung) for buchung in daten["buchungen"]]
+    if "zinssatz" in daten:
+        konto.zinssatz = daten["zinssatz"]
+    return konto
+
+
+class Journal:
+    def __init__(self, pfad="journal.log", dauerhaftigkeit="gruppe", gruppengroesse=100, wartezeit=0.05):
+        """
+        Protokolliert Buchungen in einer Datei, bevor sie auf die Konten geschrieben werden.
+        Einträge werden in Gruppen geschrieben (Group Commit): Während eine Gruppe geschrieben wird,
+        sammeln sich neue Einträge im Puffer und werden zusammen mit der nächsten Gruppe geschrieben.
+
+        Dauerhaftigkeit:
+            "sofort": Eine Buchung kehrt erst zurück, wenn ihr Eintrag mit fsync gesichert ist.
+                      Gleichzeitige Einträge anderer Threads werden mit derselben Gruppe gesichert.
+            "gruppe": Eine Buchung kehrt sofort zurück. Ein Hintergrund-Thread sichert die Einträge mit fsync,
+                      sobald gruppengroesse erreicht ist oder der älteste Eintrag wartezeit Sekunden alt ist.
+                      Bei einem Absturz gehen höchstens die Einträge dieser Zeitspanne verloren.
+            "keine":  Wie "gruppe", aber ohne fsync. Die Einträge werden nach derselben Regel an das
+                      Betriebssystem übergeben und überstehen einen Absturz des Programms, aber keinen
+                      Absturz des Betriebssystems oder Stromausfall.
+
+        Beim normalen Beenden des Programms wird schliessen() automatisch aufgerufen (atexit), damit der Puffer
+        nicht verloren geht. Wird das Journal vorher nicht mehr gebraucht, sollte schliessen() direkt aufgerufen werden.
+
+        :param pfad: str: Die Journal-Datei
+        :param dauerhaftigkeit: str
+        :param gruppengroesse: int: Anzahl der Einträge, ab der eine Gruppe sofort geschrieben wird
+        :param wartezeit: float: Maximale Zeit in Sekunden, die ein Eintrag im Puffer wartet
+        """
+        typecheck(pfad, str)
+        typecheck(gruppengroesse, int)
+        typecheck(wartezeit, (int, float))
+        if dauerhaftigkeit not in ("sofort", "gruppe", "keine"):
+            raise ValueError(f"Ungültige Dauerhaftigkeit: {dauerhaftigkeit}")
+        if gruppengroesse < 1:
+            raise ValueError("Gruppengröße muss größer als 0 sein")
+        if wartezeit <= 0:
+            raise ValueError("Wartezeit muss größer als 0 sein")
+        self.pfad = pfad
+        self.dauerhaftigkeit = dauerhaftigkeit
+        self.gruppengroesse = gruppengroesse
+        self.wartezeit = wartezeit
+        self.konten = {}  # Angemeldete Konten (IBAN -> Konto)
+        self.nr = 0  # Nummer des letzten Eintrags
+        self.gesichert = 0  # Nummer des letzten geschriebenen Eintrags
+        self.puffer = []  # Noch nicht geschriebene Einträge
+        self.aeltester = 0.0  # Zeitpunkt, seit dem der älteste Eintrag im Puffer wartet
+        self.schreibt = False  # Gibt an, ob gerade eine Gruppe geschrieben wird
+        self.fehler = None  # Fehler beim Schreiben (danach werden keine Einträge mehr angenommen)
+        self.geschlossen = False
+        self.bedingung = threading.Condition()
+
+        # Vorhandenes Journal prüfen: Eine unvollständige letzte Zeile (Absturz beim Schreiben) wird abgeschnitten
+        if os.path.exists(pfad):
+            gueltig = 0
+            with open(pfad, "rb") as file:
+                for zeile in file:
+                    if not zeile.endswith(b"\n"):
+                        break
+                    try:
+                        self.nr = json.loads(zeile)["nr"]
+                    except (json.JSONDecodeError, KeyError):
+                        break
+                    gueltig += len(zeile)
+            os.truncate(pfad, gueltig)
+        self.gesichert = self.nr
+        self.datei = open(pfad, "ab")
+
+        # Der Hintergrund-Thread sorgt dafür, dass kein Eintrag länger als wartezeit im Puffer bleibt
+        self.thread = None
+        if dauerhaftigkeit != "sofort":
+            self.thread = threading.Thread(target=self._hintergrund, daemon=True)
+            self.thread.start()
+        atexit.register(self.schliessen)
+
+    def anmelden(self, *konten):
+        """
+        Verbindet Konten mit dem Journal. Der aktuelle Stand jedes Kontos wird dabei protokolliert.
+
+        :param konten: Konto
+        :return: None
+        """
+        for konto in konten:
+            typecheck(konto, Konto)
+
+        def verbinden():
+            for konto in konten:
+                konto.journal = self
+                self.konten[konto.iban] = konto
+
+        self.eintragen(*[{"konto": konto_daten(konto)} for konto in konten], anwenden=verbinden)
+
+    def schreiben(self, buchungen):
+        """
+        Protokolliert zusammengehörige Buchungen als einen Eintrag und schreibt sie auf die Konten.
+
+        :param buchungen: tuple: (Konto, (Betrag, Währung, Verwendungszweck))
+        :return: None
+        """
+        def anwenden():
+            for konto, buchung in buchungen:
+                konto.buchungen.append(buchung)
+
+        self.eintragen({"buchungen": [[konto.iban, *buchung] for konto, buchung in buchungen]}, anwenden=anwenden)
+
+    def eintragen(self, *eintraege, anwenden=None):
+        """
+        Fügt Einträge zum Puffer hinzu. Bei Dauerhaftigkeit "sofort" wird gewartet, bis sie gesichert sind.
+        anwenden wird unter derselben Sperre ausgeführt, in der die Einträge ihre Nummer bekommen. Ein Snapshot
+        sieht deshalb immer genau die Einträge bis zu einer Nummer.
+
+        :param eintraege: dict
+        :param anwenden: callable: Wendet die Einträge im Speicher an (z.B. Buchungen auf die Konten schreiben)
+        :return: None
+        """
+        with self.bedingung:
+            if self.fehler is not None:
+                raise ValueError(f"Journal kann nicht mehr geschrieben werden: {self.fehler}")
+            if self.geschlossen:
+                raise ValueError("Journal ist geschlossen")
+            if not self.puffer:
+                self.aeltester = time.monotonic()
+            for eintrag in eintraege:
+                self.nr += 1
+                self.puffer.append((json.dumps({"nr": self.nr, **eintrag}) + "\n").encode())
+            if anwenden is not None:
+                anwenden()
+            if self.dauerhaftigkeit == "sofort":
+                self._warten_bis(self.nr)
+            elif len(self.puffer) == len(eintraege) or len(self.puffer) >= self.gruppengroesse:
+                # Hintergrund-Thread wecken: neuer Zeitraum beginnt oder Gruppe ist voll
+                self.bedingung.notify_all()
+
+    def sichern(self):
+        """
+        Wartet, bis alle bisherigen Einträge geschrieben sind.
+
+        :return: None
+        """
+        with self.bedingung:
+            self._warten_bis(self.nr)
+
+    def _warten_bis(self, nr):
+        # Nur mit gehaltener Sperre aufrufen
+        # Ist gerade keine Gruppe in Arbeit, schreibt dieser Thread die nächste Gruppe selbst
+        while self.gesichert < nr:
+            if self.fehler is not None:
+                raise ValueError(f"Journal kann nicht mehr geschrieben werden: {self.fehler}")
+            if self.schreibt:
+                self.bedingung.wait()
+            else:
+                self._gruppe_schreiben()
+
+    def _gruppe_schreiben(self):
+        # Nur mit gehaltener Sperre aufrufen, während keine andere Gruppe geschrieben wird
+        # Die Sperre wird während des Schreibens freigegeben, damit sich die nächste Gruppe füllen kann
+        gruppe, self.puffer = self.puffer, []
+        bis = self.nr
+        self.schreibt = True
+        self.bedingung.release()
+        try:
+            self.datei.write(b"".join(gruppe))
+            self.datei.flush()
+            if self.dauerhaftigkeit != "keine":
+                os.fsync(self.datei.fileno())
+        except OSError as fehler:
+            self.fehler = fehler
+        finally:
+            self.bedingung.acquire()
+            self.schreibt = False
+            if self.fehler is None:
+                self.gesichert = bis
+            self.bedingung.notify_all()
+
+    def _hintergrund(self):
+        # Schreibt Gruppen, sobald sie voll sind oder der älteste Eintrag zu lange wartet
+        with self.bedingung:
+            while not self.geschlossen and self.fehler is None:
+                if not self.puffer or self.schreibt:
+                    self.bedingung.wait()
+                    continue
+                rest = self.aeltester + self.wartezeit - time.monotonic()
+                if rest <= 0 or len(self.puffer) >= self.gruppengroesse:
+                    self._gruppe_schreiben()
+                else:
+                    self.bedingung.wait(rest)
+
+    def _leeren(self):
+        # Nur mit gehaltener Sperre aufrufen; wartet, bis der Puffer leer ist und keine Gruppe mehr geschrieben wird
+        while self.puffer or self.schreibt:
+            self._warten_bis(self.nr)
+            while self.schreibt:
+                self.bedingung.wait()
+
+    def eintraege(self):
+        """
+        Liest alle gesicherten Einträge aus der Datei.
+
+        :return: generator: Die Einträge (dict)
+        """
+        self.sichern()
+        with open(self.pfad, "rb") as file:
+            for zeile in file:
+                yield json.loads(zeile)
+
+    def kuerzen(self, bis):
+        """
+        Entfernt alle Einträge bis zur angegebenen Nummer aus dem Journal (z.B. nach einem Snapshot).
+        Neuere Einträge bleiben erhalten, die Nummerierung läuft weiter.
+
+        :param bis: int: Nummer des letzten Eintrags, der entfernt werden darf
+        :return: None
+        """
+        typecheck(bis, int)
+        with self.bedingung:
+            self._leeren()
+            self.datei.close()
+            # Die erste Zeile enthält nur die Nummer, damit die Nummerierung nach einem Neustart weiterläuft
+            with open(self.pfad, "rb") as alt, open(self.pfad + ".tmp", "wb") as file:
+                file.write((json.dumps({"nr": bis}) + "\n").encode())
+                for zeile in alt:
+                    if json.loads(zeile)["nr"] > bis:
+                        file.write(zeile)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(self.pfad + ".tmp", self.pfad)
+            ordner_sichern(self.pfad)
+            self.datei = open(self.pfad, "ab")
+
+    def schliessen(self):
+        """
+        Sichert alle Einträge, beendet den Hintergrund-Thread und schließt die Datei.
+
+        :return: None
+        """
+        with self.bedingung:
+            if self.geschlossen:
+                return
+            self._leeren()
+            self.geschlossen = True
+            self.bedingung.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.datei.close()
+        atexit.unregister(self.schliessen)
+
+
+def ordner_sichern(pfad):
+    """
+    Sichert den Ordner einer Datei mit fsync, damit ein os.replace auch nach einem Absturz erhalten bleibt.
+
+    :param pfad: str: Die Datei
+    :return: None
+    """
+    if os.name == "nt":
+        # Unter Windows lassen sich Ordner nicht öffnen, NTFS sichert die Umbenennung selbst
+        return
+    ordner = os.open(os.path.dirname(os.path.abspath(pfad)), os.O_RDONLY)
+    try:
+        os.fsync(ordner)
+    finally:
+        os.close(ordner)
+
+
+def snapshot_speichern(konten, pfad="snapshot.json", journal=None):
+    """
+    Speichert den Stand aller Konten in einer Datei. Mit Journal werden zusätzlich alle dort angemeldeten
+    Konten gespeichert, der Snapshot wird der Nummer des letzten enthaltenen Eintrags zugeordnet und das
+    Journal danach bis zu dieser Nummer gekürzt.
+    Buchungen dürfen währenddessen weiterlaufen: Der Stand wird unter der Sperre des Journals kopiert,
+    spätere Einträge bleiben im Journal.
+
+    :param konten: list: Die Konten
+    :param pfad: str: Die Snapshot-Datei
+    :param journal: Journal
+    :return: None
+    """
+    konten = list(konten)
+    if journal is None:
+        daten = {"nr": 0, "konten": [konto_daten(konto) for konto in konten]}
+    else:
+        typecheck(journal, Journal)
+        with journal.bedingung:
+            # Das gekürzte Journal enthält diese Konten nicht mehr, deshalb müssen alle angemeldeten Konten
+            # in den Snapshot
+            enthalten = {id(konto) for konto in konten}
+            konten += [konto for konto in journal.konten.values() if id(konto) not in enthalten]
+            daten = {"nr": journal.nr, "konten": [konto_daten(konto) for konto in konten]}
+    # Erst in eine temporäre Datei schreiben, damit nie ein halber Snapshot existiert
+    with open(pfad + ".tmp", "w") as file:
+        json.dump(daten, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(pfad + ".tmp", pfad)
+    # Der Snapshot muss sicher auf der Festplatte sein, bevor das Journal gekürzt wird
+    ordner_sichern(pfad)
+    if journal is not None:
+        journal.kuerzen(daten["nr"])
+
+
+def wiederherstellen(pfad="snapshot.json", journal=None):
+    """
+    Stellt die Konten nach einem Neustart wieder her: Der letzte Snapshot wird geladen und alle
+    neueren Einträge des Journals werden nachgebucht. Die Konten werden wieder mit dem Journal verbunden.
+    Buchungen auf Konten, die nicht beim Journal angemeldet sind, werden übergangen.
+
+    :param pfad: str: Die Snapshot-Datei (falls vorhanden)
+    :param journal: Journal
+    :return: list: Die Konten
+    """
+    konten = {}
+    nr = 0
+    if os.path.exists(pfad):
+        with open(pfad, "r") as file:
+            daten = json.load(file)
+        nr = daten["nr"]
+        for konto_json in daten["konten"]:
+            konto = konto_aus_daten(konto_json)
+            konten[konto.iban] = konto
+    if journal is not None:
+        typecheck(journal, Journal)
+        for eintrag in journal.eintraege():
+            # Einträge, die bereits im Snapshot enthalten sind, überspringen
+            if eintrag["nr"] <= nr:
+                continue
+            if "konto" in eintrag:
+                konto = konto_aus_daten(eintrag["konto"])
+                konten[konto.iban] = konto
+            for iban, betrag, waehrung, verwendungszweck in eintrag.get("buchungen", []):
+                if iban in konten:
+                    konten[iban].buchungen.append((betrag, waehrung, verwendungszweck))
+        for konto in konten.values():
+            konto.journal = journal
+            journal.konten[konto.iban] = konto
+    return list(konten.values())
 # endregion
 
 
@@ -442,9 +900,8 @@ if __name__ == "__main__":
     # Umwandlung von Währungen
     konto2.umrechnen(100, "EUR", "USD")
 
-    # Verrechnung der Währungen
-    konto2.waehrungen_verrechnen()
-    konto3.waehrungen_verrechnen()
+    # Verrechnung der Währungen (beide Konten in einem Durchgang zum gemeinsamen Kurs)
+    konten_verrechnen([konto2, konto3])
 
     # Zinsen berechnen
     konto4.zinsen_berechnen()
@@ -1,8 +1,10 @@
 from dotenv import load_dotenv
 import os
 import requests
+import atexit
 import json
 import random
+import threading
 import time
 import re
 load_dotenv()
@@ -87,6 +89,14 @@ class Boerse:
         if nach not in self.waehrungen:
             raise ValueError(f"Ungültige Währung: {nach}")
         return betrag / self.kurse[von] * self.kurse[nach]
+    def kurs(self, von, nach):
+        typecheck(von, str)
+        typecheck(nach, str)
+        if von not in self.kurse:
+            raise ValueError(f"Ungültige Währung: {von}")
+        if nach not in self.kurse:
+            raise ValueError(f"Ungültige Währung: {nach}")
+        return self.kurse[nach] / self.kurse[von]
 class Konto:
     def __init__(self, inhaber, iban=""):
         self.inhaber = inhaber
@@ -95,6 +105,7 @@ class Konto:
             self.iban = f"DE {random.randint(0, 9):02d}{random.randint(0, 99):02d} {random.randint(0, 9999):04d} " \
                         f"{random.randint(0, 9999):04d} {random.randint(0, 9999):04d} {random.randint(0, 9999):04d}"
         self.buchungen = []  
+        self.journal = None  
     def __str__(self):
         return f"{self.inhaber} / {self.iban} / {self.saldo(formatiert=True)}" 
     def __repr__(self):
@@ -107,11 +118,20 @@ class Konto:
         konto.iban = data["iban"]
         konto.buchungen = data["buchungen"]
         return konto
+    def buchungen_schreiben(self, *buchungen):
+        journale = {id(konto.journal): konto.journal for konto, _buchung in buchungen if konto.journal is not None}
+        if len(journale) > 1:
+            raise ValueError("Die Konten gehören zu verschiedenen Journalen")
+        if journale:
+            journale.popitem()[1].schreiben(buchungen)
+            return
+        for konto, buchung in buchungen:
+            konto.buchungen.append(buchung)
     def buchen(self, betrag, verwendungszweck):
         betrag, waehrung = waehrung_interpretieren(betrag)
         if waehrung != "EUR":
             raise ValueError("Buchungen können nur in Euro durchgeführt werden")
-        self.buchungen.append((betrag, waehrung, verwendungszweck))
+        self.buchungen_schreiben((self, (betrag, waehrung, verwendungszweck)))
     def ueberweisen(self, ziel, betrag, verwendungszweck):
         typecheck(ziel, Konto)
         betrag, waehrung = waehrung_interpretieren(betrag)
@@ -121,8 +141,8 @@ class Konto:
             raise ValueError("Nicht genügend Guthaben") 
         if betrag <= 0:
             raise ValueError("Betrag muss größer als 0 sein")
-        self.buchungen.append((-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-        ziel.buchungen.append((betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+        self.buchungen_schreiben((self, (-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                 (ziel, (betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}")))
     def saldo(self, formatiert=False):
         saldo = 0
         for buchung in self.buchungen:
@@ -152,21 +172,21 @@ class MultiKonto(Konto):
         self.boerse = Boerse()
     def buchen(self, betrag, verwendungszweck):
         betrag, waehrung = waehrung_interpretieren(betrag)
-        self.buchungen.append((betrag, waehrung, verwendungszweck))
+        self.buchungen_schreiben((self, (betrag, waehrung, verwendungszweck)))
     def ueberweisen(self, ziel, betrag, verwendungszweck):
         if isinstance(ziel, MultiKonto):
             betrag, waehrung = waehrung_interpretieren(betrag)
             if self.saldo() - self.boerse.umrechnen(betrag, waehrung, "EUR") < 0:
                 raise ValueError("Nicht genügend Guthaben")
-            self.buchungen.append((-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-            ziel.buchungen.append((betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+            self.buchungen_schreiben((self, (-betrag, waehrung, f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                     (ziel, (betrag, waehrung, f"Überweisung von {self.inhaber}: {verwendungszweck}")))
         else:
             betrag, waehrung = waehrung_interpretieren(betrag)
             betrag = round(self.boerse.umrechnen(betrag, waehrung, "EUR"), 2)
             if self.saldo() < betrag:
                 raise ValueError("Nicht genügend Guthaben")
-            self.buchungen.append((-betrag, "EUR", f"Überweisung an {ziel.inhaber}: {verwendungszweck}"))
-            ziel.buchungen.append((betrag, "EUR", f"Überweisung von {self.inhaber}: {verwendungszweck}"))
+            self.buchungen_schreiben((self, (-betrag, "EUR", f"Überweisung an {ziel.inhaber}: {verwendungszweck}")),
+                                     (ziel, (betrag, "EUR", f"Überweisung von {self.inhaber}: {verwendungszweck}")))
     def saldo(self, waehrung="", formatiert=False):
         if waehrung == "":
             if formatiert:
@@ -182,22 +202,268 @@ class MultiKonto(Konto):
         betrag, _waehrung = waehrung_interpretieren(betrag)
         if von not in self.boerse.waehrungen:
             raise ValueError(f"Ungültige Währung: {von}")
-        self.buchungen.append((-betrag, von, verwendungszweck))
         umgerechnet = round(self.boerse.umrechnen(betrag, von, nach), 2)
-        self.buchungen.append((umgerechnet, nach, verwendungszweck))
+        self.buchungen_schreiben((self, (-betrag, von, verwendungszweck)),
+                                 (self, (umgerechnet, nach, verwendungszweck)))
     def waehrungen_verrechnen(self):
-        waehrungen = [waehrung for waehrung in self.boerse.waehrungen if waehrung != "EUR"]
-        for waehrung in waehrungen:
-            saldo = self.saldo(waehrung)
+        konten_verrechnen([self], self.boerse)
+def konten_verrechnen(konten, boerse=None):
+    if boerse is None:
+        boerse = Boerse()
+    typecheck(boerse, Boerse)
+    konten = list({id(konto): konto for konto in konten}.values())
+    positionen = []
+    for konto in konten:
+        typecheck(konto, MultiKonto)
+        salden = {}
+        for buchung in konto.buchungen:
+            if buchung[1] != "EUR":
+                salden[buchung[1]] = salden.get(buchung[1], 0) + buchung[0]
+        positionen.append(salden)
+    reihenfolge = {waehrung: i for i, waehrung in enumerate(boerse.waehrungen)}
+    kurse = {}
+    for salden in positionen:
+        for waehrung in salden:
+            if waehrung not in kurse and waehrung in reihenfolge:
+                kurse[waehrung] = boerse.kurs(waehrung, "EUR")
+    netto = {}
+    for konto, salden in zip(konten, positionen):
+        buchungen = []
+        for waehrung in sorted(kurse.keys() & salden.keys(), key=reihenfolge.get):
+            saldo = salden[waehrung]
             if saldo != 0:
-                self.umrechnen(saldo, waehrung, "EUR", f"Verrechnung von {waehrung_formatieren(saldo, waehrung)}")
+                umgerechnet = round(saldo * kurse[waehrung], 2)
+                verwendungszweck = f"Verrechnung von {waehrung_formatieren(saldo, waehrung)}"
+                buchungen.append((-saldo, waehrung, verwendungszweck))
+                buchungen.append((umgerechnet, "EUR", verwendungszweck))
+                summe, summe_eur = netto.get(waehrung, (0, 0))
+                netto[waehrung] = (summe + saldo, summe_eur + umgerechnet)
+        if buchungen:
+            konto.buchungen_schreiben(*[(konto, buchung) for buchung in buchungen])
+    return netto
 class Sparkonto(Konto):
     def __init__(self, inhaber, iban=""):
         super().__init__(inhaber, iban)
         self.zinssatz = 0.0325  
     def zinsen_berechnen(self):
         zinsen = self.saldo() * self.zinssatz
-        self.buchungen.append((zinsen, "EUR", "Zinsen" + f" ({self.zinssatz * 100:.2f} %)"))
+        self.buchungen_schreiben((self, (zinsen, "EUR", "Zinsen" + f" ({self.zinssatz * 100:.2f} %)")))
+KONTOTYPEN = {"Konto": Konto, "MultiKonto": MultiKonto, "Sparkonto": Sparkonto}
+def konto_daten(konto):
+    typecheck(konto, Konto)
+    daten = {"typ": type(konto).__name__, "inhaber": konto.inhaber, "iban": konto.iban,
+             "buchungen": list(konto.buchungen)}
+    if isinstance(konto, Sparkonto):
+        daten["zinssatz"] = konto.zinssatz
+    return daten
+def konto_aus_daten(daten):
+    if daten["typ"] not in KONTOTYPEN:
+        raise ValueError(f"Ungültiger Kontotyp: {daten['typ']}")
+    konto = KONTOTYPEN[daten["typ"]](daten["inhaber"], daten["iban"])
+    konto.buchungen = [tuple(buchung) for buchung in daten["buchungen"]]
+    if "zinssatz" in daten:
+        konto.zinssatz = daten["zinssatz"]
+    return konto
+class Journal:
+    def __init__(self, pfad="journal.log", dauerhaftigkeit="gruppe", gruppengroesse=100, wartezeit=0.05):
+        typecheck(pfad, str)
+        typecheck(gruppengroesse, int)
+        typecheck(wartezeit, (int, float))
+        if dauerhaftigkeit not in ("sofort", "gruppe", "keine"):
+            raise ValueError(f"Ungültige Dauerhaftigkeit: {dauerhaftigkeit}")
+        if gruppengroesse < 1:
+            raise ValueError("Gruppengröße muss größer als 0 sein")
+        if wartezeit <= 0:
+            raise ValueError("Wartezeit muss größer als 0 sein")
+        self.pfad = pfad
+        self.dauerhaftigkeit = dauerhaftigkeit
+        self.gruppengroesse = gruppengroesse
+        self.wartezeit = wartezeit
+        self.konten = {}
+        self.nr = 0
+        self.gesichert = 0
+        self.puffer = []
+        self.aeltester = 0.0
+        self.schreibt = False
+        self.fehler = None
+        self.geschlossen = False
+        self.bedingung = threading.Condition()
+        if os.path.exists(pfad):
+            gueltig = 0
+            with open(pfad, "rb") as file:
+                for zeile in file:
+                    if not zeile.endswith(b"\n"):
+                        break
+                    try:
+                        self.nr = json.loads(zeile)["nr"]
+                    except (json.JSONDecodeError, KeyError):
+                        break
+                    gueltig += len(zeile)
+            os.truncate(pfad, gueltig)
+        self.gesichert = self.nr
+        self.datei = open(pfad, "ab")
+        self.thread = None
+        if dauerhaftigkeit != "sofort":
+            self.thread = threading.Thread(target=self._hintergrund, daemon=True)
+            self.thread.start()
+        atexit.register(self.schliessen)
+    def anmelden(self, *konten):
+        for konto in konten:
+            typecheck(konto, Konto)
+        def verbinden():
+            for konto in konten:
+                konto.journal = self
+                self.konten[konto.iban] = konto
+        self.eintragen(*[{"konto": konto_daten(konto)} for konto in konten], anwenden=verbinden)
+    def schreiben(self, buchungen):
+        def anwenden():
+            for konto, buchung in buchungen:
+                konto.buchungen.append(buchung)
+        self.eintragen({"buchungen": [[konto.iban, *buchung] for konto, buchung in buchungen]}, anwenden=anwenden)
+    def eintragen(self, *eintraege, anwenden=None):
+        with self.bedingung:
+            if self.fehler is not None:
+                raise ValueError(f"Journal kann nicht mehr geschrieben werden: {self.fehler}")
+            if self.geschlossen:
+                raise ValueError("Journal ist geschlossen")
+            if not self.puffer:
+                self.aeltester = time.monotonic()
+            for eintrag in eintraege:
+                self.nr += 1
+                self.puffer.append((json.dumps({"nr": self.nr, **eintrag}) + "\n").encode())
+            if anwenden is not None:
+                anwenden()
+            if self.dauerhaftigkeit == "sofort":
+                self._warten_bis(self.nr)
+            elif len(self.puffer) == len(eintraege) or len(self.puffer) >= self.gruppengroesse:
+                self.bedingung.notify_all()
+    def sichern(self):
+        with self.bedingung:
+            self._warten_bis(self.nr)
+    def _warten_bis(self, nr):
+        while self.gesichert < nr:
+            if self.fehler is not None:
+                raise ValueError(f"Journal kann nicht mehr geschrieben werden: {self.fehler}")
+            if self.schreibt:
+                self.bedingung.wait()
+            else:
+                self._gruppe_schreiben()
+    def _gruppe_schreiben(self):
+        gruppe, self.puffer = self.puffer, []
+        bis = self.nr
+        self.schreibt = True
+        self.bedingung.release()
+        try:
+            self.datei.write(b"".join(gruppe))
+            self.datei.flush()
+            if self.dauerhaftigkeit != "keine":
+                os.fsync(self.datei.fileno())
+        except OSError as fehler:
+            self.fehler = fehler
+        finally:
+            self.bedingung.acquire()
+            self.schreibt = False
+            if self.fehler is None:
+                self.gesichert = bis
+            self.bedingung.notify_all()
+    def _hintergrund(self):
+        with self.bedingung:
+            while not self.geschlossen and self.fehler is None:
+                if not self.puffer or self.schreibt:
+                    self.bedingung.wait()
+                    continue
+                rest = self.aeltester + self.wartezeit - time.monotonic()
+                if rest <= 0 or len(self.puffer) >= self.gruppengroesse:
+                    self._gruppe_schreiben()
+                else:
+                    self.bedingung.wait(rest)
+    def _leeren(self):
+        while self.puffer or self.schreibt:
+            self._warten_bis(self.nr)
+            while self.schreibt:
+                self.bedingung.wait()
+    def eintraege(self):
+        self.sichern()
+        with open(self.pfad, "rb") as file:
+            for zeile in file:
+                yield json.loads(zeile)
+    def kuerzen(self, bis):
+        typecheck(bis, int)
+        with self.bedingung:
+            self._leeren()
+            self.datei.close()
+            with open(self.pfad, "rb") as alt, open(self.pfad + ".tmp", "wb") as file:
+                file.write((json.dumps({"nr": bis}) + "\n").encode())
+                for zeile in alt:
+                    if json.loads(zeile)["nr"] > bis:
+                        file.write(zeile)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(self.pfad + ".tmp", self.pfad)
+            ordner_sichern(self.pfad)
+            self.datei = open(self.pfad, "ab")
+    def schliessen(self):
+        with self.bedingung:
+            if self.geschlossen:
+                return
+            self._leeren()
+            self.geschlossen = True
+            self.bedingung.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.datei.close()
+        atexit.unregister(self.schliessen)
+def ordner_sichern(pfad):
+    if os.name == "nt":
+        return
+    ordner = os.open(os.path.dirname(os.path.abspath(pfad)), os.O_RDONLY)
+    try:
+        os.fsync(ordner)
+    finally:
+        os.close(ordner)
+def snapshot_speichern(konten, pfad="snapshot.json", journal=None):
+    konten = list(konten)
+    if journal is None:
+        daten = {"nr": 0, "konten": [konto_daten(konto) for konto in konten]}
+    else:
+        typecheck(journal, Journal)
+        with journal.bedingung:
+            enthalten = {id(konto) for konto in konten}
+            konten += [konto for konto in journal.konten.values() if id(konto) not in enthalten]
+            daten = {"nr": journal.nr, "konten": [konto_daten(konto) for konto in konten]}
+    with open(pfad + ".tmp", "w") as file:
+        json.dump(daten, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(pfad + ".tmp", pfad)
+    ordner_sichern(pfad)
+    if journal is not None:
+        journal.kuerzen(daten["nr"])
+def wiederherstellen(pfad="snapshot.json", journal=None):
+    konten = {}
+    nr = 0
+    if os.path.exists(pfad):
+        with open(pfad, "r") as file:
+            daten = json.load(file)
+        nr = daten["nr"]
+        for konto_json in daten["konten"]:
+            konto = konto_aus_daten(konto_json)
+            konten[konto.iban] = konto
+    if journal is not None:
+        typecheck(journal, Journal)
+        for eintrag in journal.eintraege():
+            if eintrag["nr"] <= nr:
+                continue
+            if "konto" in eintrag:
+                konto = konto_aus_daten(eintrag["konto"])
+                konten[konto.iban] = konto
+            for iban, betrag, waehrung, verwendungszweck in eintrag.get("buchungen", []):
+                if iban in konten:
+                    konten[iban].buchungen.append((betrag, waehrung, verwendungszweck))
+        for konto in konten.values():
+            konto.journal = journal
+            journal.konten[konto.iban] = konto
+    return list(konten.values())
 if __name__ == "__main__":
     konto1 = Konto("Arasp der Krasse")
     konto2 = MultiKonto("Malte der Lustige")
@@ -212,8 +478,7 @@ if __name__ == "__main__":
     konto3.ueberweisen(konto1, "1000 JPY", "Döner kostet einfach zu viel")
     konto2.ueberweisen(konto1, "250 CAD", "Kanada ist kalt...")
     konto2.umrechnen(100, "EUR", "USD")
-    konto2.waehrungen_verrechnen()
-    konto3.waehrungen_verrechnen()
+    konten_verrechnen([konto2, konto3])
     konto4.zinsen_berechnen()
     konto1.buchungen_anzeigen()
     print(f"=    {konto1.saldo(formatiert=True)}", end="\n\n")
@@ -0,0 +1,512 @@
+# Importe
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Bank import KONTOTYPEN, MultiKonto, kurse_laden
+
+# Währungen (mit Währungszeichen, falls waehrung_interpretieren eines kennt) und typische Beträge
+WAEHRUNGEN = {
+    "EUR": ("€", 100),
+    "USD": ("$", 100),
+    "GBP": ("£", 80),
+    "JPY": ("¥", 15000),
+    "CHF": ("", 90),
+    "CAD": ("", 140),
+    "TRY": ("₺", 3500),
+    "INR": ("₹", 8500),
+}
+
+
+# region Generator
+def zipf_gewichte(anzahl, exponent, rng):
+    """
+    Erzeugt kumulierte Gewichte nach dem Zipf-Gesetz für eine zufällige Reihenfolge der Indizes.
+    Wenige "heiße" Konten bekommen so den Großteil der Aktivität ab.
+
+    :param anzahl: int: Anzahl der Einträge
+    :param exponent: float: Stärke der Schieflage (0 = gleichverteilt)
+    :param rng: random.Random: Zufallsgenerator
+    :return: tuple: (list, list): Die Indizes und die kumulierten Gewichte
+    """
+    indizes = list(range(anzahl))
+    rng.shuffle(indizes)
+    kumuliert = []
+    summe = 0
+    for rang in range(1, anzahl + 1):
+        summe += 1 / rang ** exponent
+        kumuliert.append(summe)
+    return indizes, kumuliert
+
+
+def betrag_ausdruck(rng, betrag, waehrung="EUR", ohne_waehrung=False):
+    """
+    Schreibt einen Betrag in einem zufälligen Format, das waehrung_interpretieren versteht
+    (0 bis 2 Nachkommastellen, Komma oder Punkt, Währungscode oder -zeichen davor oder dahinter).
+
+    :param rng: random.Random: Zufallsgenerator
+    :param betrag: float: Der Betrag (darf negativ sein)
+    :param waehrung: str
+    :param ohne_waehrung: bool: Gibt an, ob der Betrag auch ohne Währung geschrieben werden darf,
+                          z.B. weil die Währung separat übergeben wird (bei Euro immer erlaubt)
+    :return: int, float, str: Der Betrag als Ausdruck
+    """
+    stellen = rng.choice([0, 1, 2])
+    betrag = round(betrag, stellen)
+    zahl = f"{betrag:.{stellen}f}"
+    if rng.random() < 0.5:
+        zahl = zahl.replace(".", ",")
+    zeichen = WAEHRUNGEN[waehrung][0]
+    formate = [f"{zahl} {waehrung}", f"{waehrung} {zahl}", f"{zahl}{waehrung}"]
+    if zeichen:
+        formate += [f"{zahl} {zeichen}", f"{zeichen}{zahl}", f"{zeichen} {zahl}"]
+    if waehrung == "EUR" or ohne_waehrung:
+        # Ohne Währungsangabe wird die Standardwährung (Euro) angenommen
+        formate += [zahl, betrag]
+        if stellen == 0:
+            formate.append(int(betrag))
+    return rng.choice(formate)
+
+
+def workload_generieren(seed=0, anzahl_konten=1000, anzahl_operationen=10000, schieflage=1.1):
+    """
+    Erzeugt einen deterministischen Strom von Operationen auf Konten, MultiKonten und Sparkonten.
+    Zuerst werden alle Konten eröffnet, danach folgen Buchungen, Überweisungen, Umrechnungen,
+    Verrechnungen und Zinsberechnungen. Derselbe Seed ergibt immer denselben Strom.
+
+    Operationen (Tupel):
+        ("eroeffnen", nr, typ, inhaber, iban)
+        ("buchen", nr, betrag, verwendungszweck)
+        ("ueberweisen", nr, ziel_nr, betrag, verwendungszweck)
+        ("umrechnen", nr, betrag, von, nach)
+        ("verrechnen", nr)
+        ("zinsen", nr)
+
+    :param seed: int: Startwert des Zufallsgenerators
+    :param anzahl_konten: int
+    :param anzahl_operationen: int: Anzahl der Operationen nach der Kontoeröffnung
+    :param schieflage: float: Zipf-Exponent für die Aktivität der Konten
+    :return: generator: Die Operationen
+    """
+    if anzahl_konten < 2 or anzahl_operationen < 0:
+        raise ValueError("Mindestens zwei Konten und keine negative Anzahl an Operationen")
+    rng = random.Random(seed)
+
+    # Konten eröffnen
+    typen = rng.choices(list(KONTOTYPEN), weights=[5, 3, 2], k=anzahl_konten)
+    for nr, typ in enumerate(typen):
+        iban = f"DE {rng.randint(0, 99):02d}{rng.randint(0, 99):02d} {rng.randint(0, 9999):04d} " \
+               f"{rng.randint(0, 9999):04d} {rng.randint(0, 9999):04d} {nr:04d}"
+        yield "eroeffnen", nr, typ, f"Kunde {nr}", iban
+
+    # Aktivität ist schief verteilt: wenige Konten sind sehr aktiv ("heiße" Konten)
+    indizes, kumuliert = zipf_gewichte(anzahl_konten, schieflage, rng)
+    multi = [nr for nr in range(anzahl_konten) if typen[nr] == "MultiKonto"]
+    spar = [nr for nr in range(anzahl_konten) if typen[nr] == "Sparkonto"]
+    waehrungen = list(WAEHRUNGEN)
+
+    # Startguthaben, damit Überweisungen nicht nur abgelehnt werden
+    for nr in range(anzahl_konten):
+        yield "buchen", nr, betrag_ausdruck(rng, rng.uniform(500, 5000)), "Eröffnungsbuchung"
+
+    operationen = ["buchen", "ueberweisen", "umrechnen", "verrechnen", "zinsen"]
+    for i in range(anzahl_operationen):
+        operation = rng.choices(operationen, weights=[25, 55, 10, 6, 4])[0]
+        if operation in ("umrechnen", "verrechnen") and not multi:
+            operation = "ueberweisen"
+        if operation == "zinsen" and not spar:
+            operation = "buchen"
+
+        if operation == "verrechnen":
+            yield "verrechnen", rng.choice(multi)
+        elif operation == "zinsen":
+            yield "zinsen", rng.choice(spar)
+        elif operation == "umrechnen":
+            von, nach = rng.sample(waehrungen, 2)
+            betrag = rng.uniform(1, 0.5 * WAEHRUNGEN[von][1])
+            yield "umrechnen", rng.choice(multi), betrag_ausdruck(rng, betrag, von, ohne_waehrung=True), von, nach
+        else:
+            nr = rng.choices(indizes, cum_weights=kumuliert)[0]
+            waehrung = "EUR"
+            if typen[nr] == "MultiKonto" and rng.random() < 0.6:
+                waehrung = rng.choice(waehrungen)
+            betrag = rng.uniform(1, WAEHRUNGEN[waehrung][1])
+            if operation == "buchen":
+                # MultiKonten werden nicht auf Überziehung geprüft, dort gibt es auch Auszahlungen
+                if typen[nr] == "MultiKonto" and rng.random() < 0.15:
+                    yield "buchen", nr, betrag_ausdruck(rng, -betrag, waehrung), f"Auszahlung {i}"
+                else:
+                    yield "buchen", nr, betrag_ausdruck(rng, betrag, waehrung), f"Einzahlung {i}"
+            else:
+                ziel = rng.choices(indizes, cum_weights=kumuliert)[0]
+                while ziel == nr:
+                    ziel = rng.choices(indizes, cum_weights=kumuliert)[0]
+                yield "ueberweisen", nr, ziel, betrag_ausdruck(rng, betrag, waehrung), f"Rechnung {i}"
+
+
+# endregion
+
+
+# region Treiber
+def perzentil(werte, anteil):
+    """
+    Bestimmt ein Perzentil aus einer bereits sortierten Liste.
+
+    :param werte: list: Sortierte Werte
+    :param anteil: float: Zwischen 0 und 1
+    :return: float: Der Wert an dieser Stelle (0, falls die Liste leer ist)
+    """
+    if not werte:
+        return 0.0
+    return werte[min(len(werte) - 1, int(anteil * len(werte)))]
+
+
+def operation_ausfuehren(operation, konten):
+    """
+    Führt eine einzelne Operation aus dem Workload auf den Konten aus.
+
+    :param operation: tuple: Die Operation
+    :param konten: list: Die Konten
+    :return: None
+    """
+    art, konto = operation[0], konten[operation[1]]
+    if art == "buchen":
+        konto.buchen(operation[2], operation[3])
+    elif art == "ueberweisen":
+        konto.ueberweisen(konten[operation[2]], operation[3], operation[4])
+    elif art == "umrechnen":
+        konto.umrechnen(operation[2], operation[3], operation[4])
+    elif art == "verrechnen":
+        konto.waehrungen_verrechnen()
+    elif art == "zinsen":
+        konto.zinsen_berechnen()
+    else:
+        raise ValueError(f"Unbekannte Operation: {art}")
+
+
+def eur_wert(buchungen, kurse):
+    """
+    Berechnet den Wert von Buchungen in Euro direkt aus den Kursen (unabhängig von der Börse der Konten).
+
+    :param buchungen: list: Buchungen (Betrag, Währung, Verwendungszweck)
+    :param kurse: dict: Die Wechselkurse (Basis USD)
+    :return: float: Der Wert in Euro
+    """
+    return sum(betrag / kurse[waehrung] * kurse["EUR"] for betrag, waehrung, _zweck in buchungen)
+
+
+def buchungen_pruefen(operation, konto, neu, vorher, kurse):
+    """
+    Überprüft die Buchungen einer Operation und bestimmt, wie viel Geld sie von außen ins System bringt.
+    Nur Einzahlungen (und korrekt berechnete Zinsen) bringen Geld ins System. Umrechnungen und
+    Verrechnungen müssen wertneutral sein (bis auf die Rundung auf 0,01 je umgerechnetem Betrag),
+    nach einer Verrechnung darf keine Fremdwährung übrig bleiben.
+
+    :param operation: tuple: Die Operation
+    :param konto: Konto: Das ausführende Konto
+    :param neu: list: Die durch die Operation neu geschriebenen Buchungen auf dem Konto
+    :param vorher: float: Saldo des Kontos vor der Operation (für Zinsen)
+    :param kurse: dict: Die Wechselkurse
+    :return: tuple: (float, bool): Externer Geldfluss in Euro und ob die Buchungen korrekt sind
+    """
+    art = operation[0]
+    wert = eur_wert(neu, kurse)
+    if art == "buchen":
+        return wert, True
+    if art == "zinsen":
+        erwartet = vorher * konto.zinssatz
+        return erwartet, abs(wert - erwartet) < 0.01
+    if art in ("umrechnen", "verrechnen"):
+        korrekt = abs(wert) <= 0.01 * len(neu) / 2 + 1e-9
+        if art == "verrechnen":
+            salden = {}
+            for betrag, waehrung, _zweck in konto.buchungen:
+                if waehrung != "EUR":
+                    salden[waehrung] = salden.get(waehrung, 0) + betrag
+            korrekt = korrekt and all(abs(saldo) < 0.005 for saldo in salden.values())
+        # Die (geprüfte) Rundungsdifferenz zählt als Fluss, damit die Gesamtbilanz exakt bleibt
+        return wert, korrekt
+    return 0.0, True
+
+
+def _arbeiter(naechste, konten, sperren, kurse):
+    """
+    Arbeitet Operationen ab, bis der Workload erschöpft ist.
+
+    :param naechste: callable: Liefert die nächste Operation oder None
+    :param konten: list: Die Konten
+    :param sperren: list: Eine Sperre pro Konto
+    :param kurse: dict: Die Wechselkurse für die Prüfung
+    :return: tuple: (list, list, int, float, dict): Latenzen (inklusive Warten auf Sperren), Wartezeiten auf
+             Sperren, Anzahl abgelehnter Operationen, externer Geldfluss in Euro und fehlerhafte Buchungen je Operation
+    """
+    latenzen = []
+    wartezeiten = []
+    abgelehnt = 0
+    extern = 0.0  # Geld, das von außen ins System kommt (in Euro)
+    fehlbuchungen = {}
+    while True:
+        operation = naechste()
+        if operation is None:
+            return latenzen, wartezeiten, abgelehnt, extern, fehlbuchungen
+        # Beteiligte Konten immer in derselben Reihenfolge sperren (keine Verklemmungen)
+        beteiligte = sorted({operation[1], operation[2]}) if operation[0] == "ueberweisen" else [operation[1]]
+        # Die Latenz beginnt vor dem Sperren, damit Wartezeiten auf heiße Konten mitgemessen werden
+        start = time.perf_counter()
+        for nr in beteiligte:
+            sperren[nr].acquire()
+        try:
+            wartezeiten.append(time.perf_counter() - start)
+            konto = konten[operation[1]]
+            anzahl = len(konto.buchungen)
+            vorher = konto.saldo() if operation[0] == "zinsen" else 0.0
+            try:
+                operation_ausfuehren(operation, konten)
+            except ValueError:
+                abgelehnt += 1
+            latenzen.append(time.perf_counter() - start)
+            # Überweisungen verschieben nur Geld und werden über die Gesamtbilanz geprüft
+            if operation[0] != "ueberweisen":
+                fluss, korrekt = buchungen_pruefen(operation, konto, konto.buchungen[anzahl:], vorher, kurse)
+                extern += fluss
+                if not korrekt:
+                    fehlbuchungen[operation[0]] = fehlbuchungen.get(operation[0], 0) + 1
+        finally:
+            for nr in beteiligte:
+                sperren[nr].release()
+
+
+def erhaltung_pruefen(konten, extern, kurse):
+    """
+    Überprüft, ob Geld weder verloren gegangen noch aus dem Nichts entstanden ist.
+    Der Wert aller Buchungen in Euro muss dem externen Geldfluss entsprechen.
+    Außerdem darf kein reines Euro-Konto überzogen sein.
+
+    :param konten: list: Die Konten
+    :param extern: float: Externer Geldfluss in Euro
+    :param kurse: dict: Die Wechselkurse
+    :return: tuple: (dict, int): Abweichung (in Euro) und Anzahl überzogener Konten
+    """
+    summe = 0.0
+    ueberzogen = 0
+    for konto in konten:
+        summe += eur_wert(konto.buchungen, kurse)
+        if not isinstance(konto, MultiKonto) and konto.saldo() < -0.005:
+            ueberzogen += 1
+    abweichungen = {}
+    if abs(summe - extern) >= 0.01:
+        abweichungen["EUR"] = summe - extern
+    return abweichungen, ueberzogen
+
+
+def workload_abspielen(workload, threads=1, journal=None):
+    """
+    Spielt einen Workload gegen das Bank-Modul ab und erstellt einen Bericht.
+    Die Konten werden vorab im aufrufenden Thread eröffnet, die übrigen Operationen
+    werden auf die angegebene Anzahl an Threads verteilt.
+
+    :param workload: iterable: Operationen, z.B. aus workload_generieren
+    :param threads: int: Anzahl der Threads (1 = im aufrufenden Thread)
+    :param journal: Journal: Falls angegeben, werden alle Buchungen darin protokolliert
+    :return: dict: Der Bericht
+    """
+    if threads < 1:
+        raise ValueError("Mindestens ein Thread erforderlich")
+    workload = iter(workload)
+    konten = []
+    erste = None
+    for operation in workload:
+        if operation[0] != "eroeffnen":
+            erste = operation
+            break
+        _art, nr, typ, inhaber, iban = operation
+        if nr != len(konten):
+            raise ValueError(f"Konto {nr} wird nicht in Reihenfolge eröffnet")
+        konten.append(KONTOTYPEN[typ](inhaber, iban))
+    sperren = [threading.Lock() for _ in konten]
+    kurse = kurse_laden()
+    if journal is not None:
+        journal.anmelden(*konten)
+
+    # Der Workload wird von allen Threads gemeinsam gelesen
+    lesesperre = threading.Lock()
+    puffer = [erste] if erste is not None else []
+
+    def naechste():
+        with lesesperre:
+            if puffer:
+                return puffer.pop()
+            return next(workload, None)
+
+    beginn = time.time()  # Für die Zusammenfassung mehrerer Prozesse
+    start = time.perf_counter()
+    if threads == 1:
+        ergebnisse = [_arbeiter(naechste, konten, sperren, kurse)]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            auftraege = [executor.submit(_arbeiter, naechste, konten, sperren, kurse) for _ in range(threads)]
+            ergebnisse = [auftrag.result() for auftrag in auftraege]
+    if journal is not None:
+        journal.sichern()
+    dauer = time.perf_counter() - start
+    ende = time.time()
+
+    latenzen = []
+    wartezeiten = []
+    abgelehnt = 0
+    extern = 0.0
+    fehlbuchungen = {}
+    for teil_latenzen, teil_wartezeiten, teil_abgelehnt, teil_extern, teil_fehlbuchungen in ergebnisse:
+        latenzen += teil_latenzen
+        wartezeiten += teil_wartezeiten
+        abgelehnt += teil_abgelehnt
+        extern += teil_extern
+        for art, anzahl in teil_fehlbuchungen.items():
+            fehlbuchungen[art] = fehlbuchungen.get(art, 0) + anzahl
+    abweichungen, ueberzogen = erhaltung_pruefen(konten, extern, kurse)
+    bericht = bericht_erstellen(latenzen, wartezeiten, abgelehnt, dauer, abweichungen, ueberzogen, fehlbuchungen,
+                                len(konten))
+    bericht["beginn"], bericht["ende"] = beginn, ende
+    return bericht
+
+
+def bericht_erstellen(latenzen, wartezeiten, abgelehnt, dauer, abweichungen, ueberzogen, fehlbuchungen, konten):
+    """
+    Fasst die Messwerte eines Laufs in einem Bericht zusammen.
+
+    :param latenzen: list: Latenzen der einzelnen Operationen in Sekunden (inklusive Warten auf Sperren)
+    :param wartezeiten: list: Wartezeiten auf Sperren in Sekunden
+    :param abgelehnt: int: Anzahl abgelehnter Operationen
+    :param dauer: float: Gesamtdauer in Sekunden
+    :param abweichungen: dict: Abweichungen der Gesamtbilanz in Euro
+    :param ueberzogen: int: Anzahl überzogener Euro-Konten
+    :param fehlbuchungen: dict: Anzahl fehlerhafter Buchungen je Operation (z.B. falsche Umrechnung)
+    :param konten: int: Anzahl der Konten
+    :return: dict: Der Bericht
+    """
+    latenzen = sorted(latenzen)
+    wartezeiten = sorted(wartezeiten)
+    return {
+        "konten": konten,
+        "operationen": len(latenzen),
+        "abgelehnt": abgelehnt,
+        "dauer": dauer,
+        "durchsatz": len(latenzen) / dauer if dauer > 0 else 0.0,
+        "latenz_p50": perzentil(latenzen, 0.50),
+        "latenz_p95": perzentil(latenzen, 0.95),
+        "latenz_p99": perzentil(latenzen, 0.99),
+        "latenz_max": latenzen[-1] if latenzen else 0.0,
+        "warten_p99": perzentil(wartezeiten, 0.99),
+        "warten_max": wartezeiten[-1] if wartezeiten else 0.0,
+        "abweichungen": abweichungen,
+        "ueberzogen": ueberzogen,
+        "fehlbuchungen": fehlbuchungen,
+        "erhaltung_ok": not abweichungen and ueberzogen == 0 and not fehlbuchungen,
+        "latenzen": latenzen,
+        "wartezeiten": wartezeiten,
+    }
+
+
+def _prozess(argumente):
+    """
+    Erzeugt und spielt einen Workload in einem eigenen Prozess ab.
+
+    :param argumente: tuple: (seed, parameter)
+    :return: dict: Der Bericht des Prozesses
+    """
+    seed, parameter = argumente
+    return workload_abspielen(workload_generieren(seed, **parameter))
+
+
+def lasttest(seed=0, modus="einzeln", worker=4, **parameter):
+    """
+    Führt einen Lasttest durch.
+
+    Modi:
+        "einzeln":  ein Workload, ein Thread
+        "threads":  ein Workload, verteilt auf mehrere Threads
+        "prozesse": jeder Prozess bekommt einen eigenen Workload (Seed + Prozessnummer) mit eigenen
+                    Konten und einem Anteil der Konten und Operationen, die Berichte werden zusammengefasst.
+                    Insgesamt werden so gleich viele Konten und Operationen abgespielt wie in den
+                    anderen Modi. Als Dauer zählt
+                    (wie in den anderen Modi) nur das Abspielen: vom frühesten Beginn bis zum spätesten
+                    Ende der Abspielphasen, ohne Start der Prozesse und Kontoeröffnung.
+
+    :param seed: int
+    :param modus: str
+    :param worker: int: Anzahl der Threads bzw. Prozesse
+    :param parameter: Weitere Parameter für workload_generieren
+    :return: dict: Der Bericht
+    """
+    if modus == "einzeln":
+        return workload_abspielen(workload_generieren(seed, **parameter))
+    if modus == "threads":
+        return workload_abspielen(workload_generieren(seed, **parameter), threads=worker)
+    if modus != "prozesse":
+        raise ValueError(f"Unbekannter Modus: {modus}")
+
+    # Konten und Operationen gleichmäßig auf die Prozesse aufteilen
+    konten = parameter.pop("anzahl_konten", 1000)
+    operationen = parameter.pop("anzahl_operationen", 10000)
+    if konten < 2 * worker:
+        raise ValueError("Jeder Prozess braucht mindestens zwei Konten")
+    auftraege = []
+    for i in range(worker):
+        anteil_konten = konten // worker + (1 if i < konten % worker else 0)
+        anteil_operationen = operationen // worker + (1 if i < operationen % worker else 0)
+        auftraege.append((seed + i, dict(parameter, anzahl_konten=anteil_konten,
+                                         anzahl_operationen=anteil_operationen)))
+    with multiprocessing.Pool(worker) as pool:
+        berichte = pool.map(_prozess, auftraege)
+    dauer = max(bericht["ende"] for bericht in berichte) - min(bericht["beginn"] for bericht in berichte)
+
+    latenzen = []
+    wartezeiten = []
+    abweichungen = {}
+    fehlbuchungen = {}
+    for i, bericht in enumerate(berichte):
+        latenzen += bericht["latenzen"]
+        wartezeiten += bericht["wartezeiten"]
+        for art, anzahl in bericht["fehlbuchungen"].items():
+            fehlbuchungen[art] = fehlbuchungen.get(art, 0) + anzahl
+        # Abweichungen je Prozess behalten, damit sich Abweichungen mit verschiedenen Vorzeichen nicht aufheben
+        for waehrung, differenz in bericht["abweichungen"].items():
+            abweichungen[f"Prozess {i}: {waehrung}"] = differenz
+    return bericht_erstellen(latenzen, wartezeiten, sum(bericht["abgelehnt"] for bericht in berichte), dauer,
+                             abweichungen, sum(bericht["ueberzogen"] for bericht in berichte), fehlbuchungen,
+                             sum(bericht["konten"] for bericht in berichte))
+
+
+def bericht_anzeigen(bericht):
+    """
+    Gibt einen Bericht formatiert aus.
+
+    :param bericht: dict
+    :return: None
+    """
+    print(f"Konten:        {bericht['konten']}")
+    print(f"Operationen:   {bericht['operationen']} ({bericht['abgelehnt']} abgelehnt)")
+    print(f"Dauer:         {bericht['dauer']:.2f} s")
+    print(f"Durchsatz:     {bericht['durchsatz']:.0f} Operationen/s")
+    print(f"Latenz:        p50 {bericht['latenz_p50'] * 1000:.3f} ms / p95 {bericht['latenz_p95'] * 1000:.3f} ms"
+          f" / p99 {bericht['latenz_p99'] * 1000:.3f} ms / max {bericht['latenz_max'] * 1000:.3f} ms")
+    print(f"Sperren:       Warten p99 {bericht['warten_p99'] * 1000:.3f} ms / max {bericht['warten_max'] * 1000:.3f} ms")
+    if bericht["erhaltung_ok"]:
+        print("Erhaltung:     OK")
+    else:
+        print(f"Erhaltung:     FEHLER - Abweichungen {bericht['abweichungen']}, "
+              f"{bericht['ueberzogen']} überzogene Konten, Fehlbuchungen {bericht['fehlbuchungen']}")
+
+
+# endregion
+
+
+# region Anwendungsbeispiel
+if __name__ == "__main__":
+    for modus in ["einzeln", "threads", "prozesse"]:
+        print(f"=== {modus} ===")
+        bericht_anzeigen(lasttest(seed=42, modus=modus, worker=4, anzahl_konten=200, anzahl_operationen=2000))
+        print()
+# endregion